@@ -7,6 +7,7 @@ import signal
 from service import config, db
 from service.message_queue_service import MessageQueueService, message_to_dict
 from service.rating_service import RatingService
+from service.rating_service.typedefs import ServiceNotReadyError
 
 
 async def main():
@@ -49,7 +50,10 @@ async def main():
             logging.debug("Failed to parse message %s: %s", message.body, e)
             message.ack()
         else:
-            asyncio.create_task(rating_service.enqueue(parsed_dict))
+            try:
+                rating_service.enqueue_nowait(parsed_dict)
+            except ServiceNotReadyError:
+                message.nack(requeue=True)
 
     await mq_service.listen("test_exchange", "#", on_message)
     await done
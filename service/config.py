@@ -23,6 +23,7 @@ DB_NAME = "faf"
 
 START_RATING_MEAN = 1500
 START_RATING_DEV = 500
+RATING_BATCH_SIZE = 20
 
 MQ_USER = "faf-rating-service"
 MQ_PASSWORD = "banana"
@@ -1,8 +1,8 @@
 import asyncio
-import json
-from typing import Dict
+from typing import Dict, Optional
 
 import aio_pika
+import orjson
 from aio_pika import DeliveryMode, ExchangeType
 from aio_pika.exceptions import ProbableAuthenticationError
 from pamqp import specification
@@ -20,7 +20,8 @@ class MessageQueueService:
         """
         self._logger.info("Message queue service created.")
         self._connection = None
-        self._channel = None
+        self._consumer_channels = []
+        self._publish_channel = None
         self._exchanges = {}
         self._exchange_types = {}
 
@@ -56,9 +57,11 @@ class MessageQueueService:
             )
             return
 
-        self._channel = await self._connection.channel()
-        if config.MQ_PREFETCH_COUNT:
-            await self._channel.set_qos(prefetch_count=config.MQ_PREFETCH_COUNT)
+        # Publishing gets its own long-lived channel without publisher
+        # confirms, so that a publish does not wait for a broker round trip.
+        self._publish_channel = await self._connection.channel(
+            publisher_confirms=False
+        )
         self._logger.debug("Connected to RabbitMQ %r", self._connection)
 
     async def declare_exchange(
@@ -70,7 +73,7 @@ class MessageQueueService:
             )
             return
 
-        new_exchange = await self._channel.declare_exchange(
+        new_exchange = await self._publish_channel.declare_exchange(
             exchange_name, exchange_type
         )
 
@@ -78,9 +81,13 @@ class MessageQueueService:
         self._exchange_types[exchange_name] = exchange_type
 
     async def shutdown(self) -> None:
-        if self._channel is not None:
-            await self._channel.close()
-            self._channel = None
+        if self._publish_channel is not None:
+            await self._publish_channel.close()
+            self._publish_channel = None
+
+        for channel in self._consumer_channels:
+            await channel.close()
+        self._consumer_channels.clear()
 
         if self._connection is not None:
             await self._connection.close()
@@ -92,6 +99,7 @@ class MessageQueueService:
         routing: str,
         payload: Dict,
         delivery_mode: DeliveryMode = DeliveryMode.PERSISTENT,
+        priority: Optional[int] = None,
     ) -> None:
         if self._connection is None:
             self._logger.warning(
@@ -104,11 +112,13 @@ class MessageQueueService:
             raise KeyError(f"Unknown exchange {exchange_name}.")
 
         message = aio_pika.Message(
-            json.dumps(payload).encode(), delivery_mode=delivery_mode
+            orjson.dumps(payload), delivery_mode=delivery_mode, priority=priority
         )
 
         confirmation = await exchange.publish(message, routing_key=routing)
-        if not isinstance(confirmation, specification.Basic.Ack):
+        if confirmation is not None and not isinstance(
+            confirmation, specification.Basic.Ack
+        ):
             self._logger.warning(
                 "Message could not be delivered to %s, received %s",
                 routing,
@@ -121,11 +131,26 @@ class MessageQueueService:
         routing_key: str,
         callback,
         exchange_type=ExchangeType.TOPIC,
+        max_priority: Optional[int] = None,
     ) -> None:
         if exchange_name not in self._exchanges:
             await self.declare_exchange(exchange_name, exchange_type)
 
-        queue = await self._channel.declare_queue("", exclusive=True, durable=True)
+        arguments = None
+        if max_priority is not None:
+            arguments = {"x-max-priority": max_priority}
+
+        # Every consumer gets a channel of its own. Delivery tags and
+        # acknowledgements with `multiple=True` are scoped to the channel, so
+        # they never touch the messages of other consumers.
+        channel = await self._connection.channel()
+        if config.MQ_PREFETCH_COUNT:
+            await channel.set_qos(prefetch_count=config.MQ_PREFETCH_COUNT)
+        self._consumer_channels.append(channel)
+
+        queue = await channel.declare_queue(
+            "", exclusive=True, durable=True, arguments=arguments
+        )
 
         await queue.bind(exchange=exchange_name, routing_key=routing_key)
 
@@ -142,11 +167,12 @@ class MessageQueueService:
 
 
 def message_to_dict(message: aio_pika.IncomingMessage) -> Dict:
-    decoded_dict = json.loads(message.body.decode())
+    decoded_dict = orjson.loads(message.body)
     decoded_dict.update(
         {
             "_ack": message.ack,
             "_nack": message.nack,
+            "_channel": message.channel,
             "_exchange": message.exchange,
             "_id": message.message_id,
             "_routing_key": message.routing_key,
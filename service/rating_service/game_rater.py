@@ -1,7 +1,8 @@
+import math
 from typing import Dict, List
 
 import trueskill
-from trueskill import Rating
+from trueskill import Rating, calc_draw_margin
 
 from ..decorators import with_logger
 from .typedefs import GameOutcome, GameRatingData, PlayerID
@@ -15,10 +16,14 @@ class GameRatingError(Exception):
 class GameRater:
     @classmethod
     def compute_rating(cls, rating_data: GameRatingData) -> Dict[PlayerID, Rating]:
-        rating_groups = [team.ratings for team in rating_data]
         team_outcomes = [team.outcome for team in rating_data]
         ranks = cls._ranks_from_team_outcomes(team_outcomes)
 
+        if all(len(team.ratings) == 1 for team in rating_data):
+            return cls._compute_rating_1v1(rating_data, ranks)
+
+        rating_groups = [team.ratings for team in rating_data]
+
         cls._logger.debug("Rating groups: %s", rating_groups)
         cls._logger.debug("Ranks: %s", ranks)
 
@@ -32,6 +37,46 @@ class GameRater:
 
         return player_rating_map
 
+    @staticmethod
+    def _compute_rating_1v1(
+        rating_data: GameRatingData, ranks: List[int]
+    ) -> Dict[PlayerID, Rating]:
+        """
+        With only two players, the trueskill factor graph reduces to a single
+        truncated Gaussian update, which is computed here without building
+        the graph. Gives the same results as `trueskill.rate`.
+        """
+        players = [next(iter(team.ratings.items())) for team in rating_data]
+        if ranks == [1, 0]:
+            players.reverse()
+        (winner_id, winner), (loser_id, loser) = players
+
+        env = trueskill.global_env()
+        winner_variance = winner.sigma ** 2 + env.tau ** 2
+        loser_variance = loser.sigma ** 2 + env.tau ** 2
+        c_squared = 2 * env.beta ** 2 + winner_variance + loser_variance
+        c = math.sqrt(c_squared)
+
+        diff = (winner.mu - loser.mu) / c
+        draw_margin = calc_draw_margin(env.draw_probability, 2, env) / c
+        if ranks == [0, 0]:
+            v = env.v_draw(diff, draw_margin)
+            w = env.w_draw(diff, draw_margin)
+        else:
+            v = env.v_win(diff, draw_margin)
+            w = env.w_win(diff, draw_margin)
+
+        return {
+            winner_id: Rating(
+                winner.mu + winner_variance / c * v,
+                math.sqrt(winner_variance * (1 - winner_variance / c_squared * w)),
+            ),
+            loser_id: Rating(
+                loser.mu - loser_variance / c * v,
+                math.sqrt(loser_variance * (1 - loser_variance / c_squared * w)),
+            ),
+        }
+
     @staticmethod
     def _ranks_from_team_outcomes(outcomes: List[GameOutcome]) -> List[int]:
         if outcomes == [GameOutcome.DRAW, GameOutcome.DRAW]:
@@ -1,5 +1,6 @@
 import asyncio
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, FrozenSet, List, Set, Tuple
 
 from aio_pika import IncomingMessage
 
@@ -11,7 +12,7 @@ from service.db.models import (game_player_stats, leaderboard,
 from service.decorators import with_logger
 from service.message_queue_service import MessageQueueService, message_to_dict
 from service.metrics import rating_service_backlog
-from sqlalchemy import and_, select
+from sqlalchemy import and_, bindparam, select
 from trueskill import Rating
 
 from .game_rater import GameRater, GameRatingError
@@ -19,6 +20,30 @@ from .typedefs import (GameOutcome, GameRatingData,
                        GameRatingSummaryWithCallback, PlayerID, RatingType,
                        ServiceNotReadyError, TeamRatingData)
 
+# Statements executed for every rated game are built once at import time.
+_LEADERBOARD_SELECT = select([leaderboard.c.technical_name, leaderboard.c.id])
+
+# A concurrent request may have created the rating entry in the meantime
+_RATING_INSERT = leaderboard_rating.insert().prefix_with("IGNORE")
+
+_RATING_UPDATE = (
+    leaderboard_rating.update()
+    .where(
+        and_(
+            leaderboard_rating.c.login_id == bindparam("b_player_id"),
+            leaderboard_rating.c.leaderboard_id == bindparam("b_rating_type_id"),
+        )
+    )
+    .values(
+        mean=bindparam("b_mean"),
+        deviation=bindparam("b_deviation"),
+        total_games=leaderboard_rating.c.total_games + 1,
+        won_games=leaderboard_rating.c.won_games + bindparam("b_victory_increment"),
+    )
+)
+
+_JOURNAL_INSERT = leaderboard_rating_journal.insert()
+
 
 @with_logger
 class RatingService:
@@ -34,7 +59,9 @@ class RatingService:
         self._accept_input = False
         self._queue = asyncio.Queue()
         self._task = None
+        self._backlog_cron = None
         self._rating_type_ids = None
+        self._rater_pool = None
 
     async def initialize(self) -> None:
         if self._task is not None:
@@ -42,7 +69,12 @@ class RatingService:
             return
 
         await self.update_data()
-        self._update_cron = aiocron.crontab("*/10 * * * *", func=self.update_data)
+        # Keeps the trueskill computations from blocking the event loop
+        self._rater_pool = ThreadPoolExecutor(max_workers=2)
+        # Sampled periodically instead of being updated on every message
+        self._backlog_cron = aiocron.crontab(
+            "* * * * * */5", func=self._update_backlog_metric
+        )
         self._accept_input = True
         self._logger.debug("RatingService starting...")
         self._task = asyncio.create_task(self._handle_rating_queue())
@@ -54,11 +86,13 @@ class RatingService:
 
     async def update_data(self):
         async with self._db.acquire() as conn:
-            sql = select([leaderboard])
-            result = await conn.execute(sql)
-            rows = await result.fetchall()
+            await self._load_rating_type_ids(conn)
+
+    async def _load_rating_type_ids(self, conn) -> None:
+        result = await conn.execute(_LEADERBOARD_SELECT)
+        rows = await result.fetchall()
 
-        self._rating_type_ids = {row["technical_name"]: row["id"] for row in rows}
+        self._rating_type_ids = {row[0]: row[1] for row in rows}
 
     def handle_message(self, message: IncomingMessage):
         """
@@ -74,10 +108,20 @@ class RatingService:
                 e,
             )
             message.reject()
-        else:
-            asyncio.create_task(self.enqueue(parsed_dict))
+            return
+
+        try:
+            self.enqueue_nowait(parsed_dict)
+        except ServiceNotReadyError:
+            message.nack(requeue=True)
 
     async def enqueue(self, game_info: Dict) -> None:
+        self.enqueue_nowait(game_info)
+
+    def enqueue_nowait(self, game_info: Dict) -> None:
+        """
+        Queues up a game for rating without waiting, as the queue is unbounded.
+        """
         if not self._accept_input:
             self._logger.warning("Dropped rating request %s", game_info)
             raise ServiceNotReadyError(
@@ -96,71 +140,150 @@ class RatingService:
                 game_info["_ack"]()
             return
         self._logger.debug("Queued up rating request for game %s", summary.game_id)
-        await self._queue.put(summary)
+        self._queue.put_nowait(summary)
+
+    def _update_backlog_metric(self) -> None:
         rating_service_backlog.set(self._queue.qsize())
 
     async def _handle_rating_queue(self) -> None:
         self._logger.info("RatingService started!")
         while self._accept_input or not self._queue.empty():
-            summary = await self._queue.get()
+            # Give pending enqueues a chance to run so bursts end up in one batch
+            await asyncio.sleep(0)
+            summaries = [await self._queue.get()]
+            while (
+                len(summaries) < config.RATING_BATCH_SIZE and not self._queue.empty()
+            ):
+                summaries.append(self._queue.get_nowait())
+
+            for batch in self._independent_batches(summaries):
+                await self._rate_batch(batch)
+
+            self._acknowledge(summaries)
+            for _ in summaries:
+                self._queue.task_done()
+
+        self._logger.info("RatingService stopped.")
+
+    @staticmethod
+    def _independent_batches(
+        summaries: List[GameRatingSummaryWithCallback],
+    ) -> List[List[GameRatingSummaryWithCallback]]:
+        """
+        Splits summaries into consecutive batches in which every player takes
+        part in at most one game. Games sharing a player end up in different
+        batches and are thus still rated in the order they were received.
+        """
+        batches = []
+        batch = []
+        batch_player_ids = set()
+        for summary in summaries:
+            player_ids = {
+                player_id for team in summary.teams for player_id in team.player_ids
+            }
+            if not batch_player_ids.isdisjoint(player_ids):
+                batches.append(batch)
+                batch = []
+                batch_player_ids = set()
+
+            batch.append(summary)
+            batch_player_ids |= player_ids
+
+        if batch:
+            batches.append(batch)
+
+        return batches
+
+    async def _rate_batch(self, summaries: List[GameRatingSummaryWithCallback]) -> None:
+        for summary in summaries:
             self._logger.debug("Now rating request for game  %s", summary.game_id)
 
-            try:
-                await self._rate(summary)
-            except GameRatingError:
+        results = await asyncio.gather(
+            *(self._rate(summary) for summary in summaries), return_exceptions=True
+        )
+
+        for summary, result in zip(summaries, results):
+            if isinstance(result, GameRatingError):
                 self._logger.warning("Error rating game %s", summary)
-            except Exception:  # pragma: no cover
-                self._logger.exception("Failed rating request %s", summary)
+            elif isinstance(result, Exception):  # pragma: no cover
+                self._logger.error(
+                    "Failed rating request %s", summary, exc_info=result
+                )
             else:
                 self._logger.debug("Done rating request.")
 
-            self._queue.task_done()
+    @staticmethod
+    def _acknowledge(summaries: List[GameRatingSummaryWithCallback]) -> None:
+        """
+        Acknowledges the messages of all given summaries with a single frame
+        per channel. `multiple=True` acknowledges every unsettled delivery on
+        the channel up to the latest message. This relies on every consumer
+        feeding the rating queue having a channel of its own (see
+        `MessageQueueService.listen`) on which every delivery is either
+        settled right away or put into the rating queue, which a single
+        worker processes in order.
+        """
+        last_callbacks = {}
+        for summary in summaries:
             if summary.callback is not None:
-                summary.callback()
-            rating_service_backlog.set(self._queue.qsize())
+                last_callbacks[summary.channel] = summary.callback
 
-        self._logger.info("RatingService stopped.")
+        for callback in last_callbacks.values():
+            callback(multiple=True)
 
     async def _rate(self, summary: GameRatingSummaryWithCallback) -> None:
-        rating_data = await self._get_rating_data(summary)
-        new_ratings = GameRater.compute_rating(rating_data)
+        async with self._db.acquire() as conn:
+            async with conn.begin():
+                rating_data, old_ratings = await self._get_rating_data(conn, summary)
+                new_ratings = await asyncio.get_running_loop().run_in_executor(
+                    self._rater_pool, GameRater.compute_rating, rating_data
+                )
 
-        outcome_map = {
-            player_id: team.outcome
-            for team in summary.teams
-            for player_id in team.player_ids
-        }
-
-        old_ratings = {
-            player_id: rating
-            for team in rating_data
-            for player_id, rating in team.ratings.items()
-        }
-        await self._persist_rating_changes(
-            summary.game_id, summary.rating_type, old_ratings, new_ratings, outcome_map
-        )
+                winners = frozenset().union(
+                    *(
+                        team.player_ids
+                        for team in summary.teams
+                        if team.outcome is GameOutcome.VICTORY
+                    )
+                )
+                await self._persist_rating_changes(
+                    conn,
+                    summary.game_id,
+                    summary.rating_type,
+                    old_ratings,
+                    new_ratings,
+                    winners,
+                )
+
+        # Only announce ratings once they have been committed
+        await self._notify_rating_changes(summary.rating_type, new_ratings)
 
     async def _get_rating_data(
-        self, summary: GameRatingSummaryWithCallback
-    ) -> GameRatingData:
-        ratings = {}
-        for team in summary.teams:
-            for player_id in team.player_ids:
-                ratings[player_id] = await self._get_player_rating(
-                    player_id, summary.rating_type
-                )
+        self, conn, summary: GameRatingSummaryWithCallback
+    ) -> Tuple[GameRatingData, Dict[PlayerID, Rating]]:
+        """
+        Returns the rating data of all teams along with the ratings of all
+        players combined.
+        """
+        rating_type_id = await self._get_rating_type_id(conn, summary.rating_type)
+        player_ids = frozenset().union(*(team.player_ids for team in summary.teams))
+
+        ratings = await self._get_player_ratings_bulk(conn, player_ids, rating_type_id)
 
-        return [
+        rating_data = [
             TeamRatingData(
                 team.outcome,
                 {player_id: ratings[player_id] for player_id in team.player_ids},
             )
             for team in summary.teams
         ]
+        return rating_data, ratings
 
-    async def _get_player_rating(
-        self, player_id: int, rating_type: RatingType
-    ) -> Rating:
+    async def _get_rating_type_id(self, conn, rating_type: RatingType) -> int:
+        """
+        The leaderboard table rarely changes, so it is only reloaded when
+        encountering a rating type that is not known yet.
+        """
         if self._rating_type_ids is None:
             self._logger.warning(
                 "Tried to fetch player data before initializing service."
@@ -168,102 +291,141 @@ class RatingService:
             raise ServiceNotReadyError("RatingService not yet initialized.")
 
         rating_type_id = self._rating_type_ids.get(rating_type)
+        if rating_type_id is None:
+            await self._load_rating_type_ids(conn)
+            rating_type_id = self._rating_type_ids.get(rating_type)
+
         if rating_type_id is None:
             raise ValueError(f"Unknown rating type {rating_type}.")
 
-        async with self._db.acquire() as conn:
-            sql = select(
-                [leaderboard_rating.c.mean, leaderboard_rating.c.deviation]
-            ).where(
-                and_(
-                    leaderboard_rating.c.login_id == player_id,
-                    leaderboard_rating.c.leaderboard_id == rating_type_id,
-                )
+        return rating_type_id
+
+    async def _get_player_ratings_bulk(
+        self, conn, player_ids: FrozenSet[PlayerID], rating_type_id: int
+    ) -> Dict[PlayerID, Rating]:
+        """
+        Fetch the ratings of all given players in a single query. Players
+        without a rating entry get a default one, created with a single
+        multi-row insert on the same connection.
+        """
+        sql = select(
+            [
+                leaderboard_rating.c.login_id,
+                leaderboard_rating.c.mean,
+                leaderboard_rating.c.deviation,
+            ]
+        ).where(
+            and_(
+                leaderboard_rating.c.login_id.in_(player_ids),
+                leaderboard_rating.c.leaderboard_id == rating_type_id,
             )
+        )
 
-            result = await conn.execute(sql)
-            row = await result.fetchone()
+        result = await conn.execute(sql)
+        rows = await result.fetchall()
 
-        if row is not None:
-            return Rating(row["mean"], row["deviation"])
+        ratings = {row[0]: Rating(row[1], row[2]) for row in rows}
+
+        missing = player_ids - ratings.keys()
+        if missing:
+            # No rating entry found,
+            # will create new default rating entries
+            default_rating = await self._create_default_ratings(
+                conn, missing, rating_type_id
+            )
+            for player_id in missing:
+                ratings[player_id] = default_rating
 
-        # No rating entry found,
-        # will create a new default rating entry
-        new_rating = await self._create_default_rating(conn, player_id, rating_type)
-        return new_rating
+        return ratings
 
-    async def _create_default_rating(
-        self, conn, player_id: int, rating_type: RatingType
-    ):
+    async def _create_default_ratings(
+        self, conn, player_ids: Set[PlayerID], rating_type_id: int
+    ) -> Rating:
         default_mean = config.START_RATING_MEAN
         default_deviation = config.START_RATING_DEV
-        rating_type_id = self._rating_type_ids.get(rating_type)
 
-        insertion_sql = leaderboard_rating.insert().values(
-            login_id=player_id,
-            mean=default_mean,
-            deviation=default_deviation,
-            total_games=0,
-            won_games=0,
-            leaderboard_id=rating_type_id,
+        await conn.execute(
+            _RATING_INSERT,
+            [
+                {
+                    "login_id": player_id,
+                    "mean": default_mean,
+                    "deviation": default_deviation,
+                    "total_games": 0,
+                    "won_games": 0,
+                    "leaderboard_id": rating_type_id,
+                }
+                for player_id in player_ids
+            ],
         )
-        await conn.execute(insertion_sql)
 
         return Rating(default_mean, default_deviation)
 
     async def _persist_rating_changes(
         self,
+        conn,
         game_id: int,
         rating_type: RatingType,
         old_ratings: Dict[PlayerID, Rating],
         new_ratings: Dict[PlayerID, Rating],
-        outcomes: Dict[PlayerID, GameOutcome],
+        winners: FrozenSet[PlayerID],
     ) -> None:
         """
         Persist computed ratings to the respective players' selected rating
         """
-        async with self._db.acquire() as conn:
-            for player_id, new_rating in new_ratings.items():
-                old_rating = old_ratings[player_id]
-
-                rating_type_id = self._rating_type_ids[rating_type]
-
-                journal_insert_sql = leaderboard_rating_journal.insert().values(
-                    leaderboard_id=rating_type_id,
-                    rating_mean_before=old_rating.mu,
-                    rating_deviation_before=old_rating.sigma,
-                    rating_mean_after=new_rating.mu,
-                    rating_deviation_after=new_rating.sigma,
-                    game_player_stats_id=select([game_player_stats.c.id]).where(
-                        and_(
-                            game_player_stats.c.playerId == player_id,
-                            game_player_stats.c.gameId == game_id,
-                        )
-                    ),
-                )
-                await conn.execute(journal_insert_sql)
+        rating_type_id = self._rating_type_ids[rating_type]
 
-                victory_increment = (
-                    1 if outcomes[player_id] is GameOutcome.VICTORY else 0
-                )
-                rating_update_sql = (
-                    leaderboard_rating.update()
-                    .where(
-                        and_(
-                            leaderboard_rating.c.login_id == player_id,
-                            leaderboard_rating.c.leaderboard_id == rating_type_id,
-                        )
-                    )
-                    .values(
-                        mean=new_rating.mu,
-                        deviation=new_rating.sigma,
-                        total_games=leaderboard_rating.c.total_games + 1,
-                        won_games=leaderboard_rating.c.won_games + victory_increment,
-                    )
-                )
-                await conn.execute(rating_update_sql)
+        sql = select([game_player_stats.c.playerId, game_player_stats.c.id]).where(
+            and_(
+                game_player_stats.c.gameId == game_id,
+                game_player_stats.c.playerId.in_(new_ratings),
+            )
+        )
+        result = await conn.execute(sql)
+        rows = await result.fetchall()
+        game_player_stats_ids = {row[0]: row[1] for row in rows}
+
+        await conn.execute(
+            _JOURNAL_INSERT,
+            [
+                {
+                    "leaderboard_id": rating_type_id,
+                    "rating_mean_before": old_ratings[player_id].mu,
+                    "rating_deviation_before": old_ratings[player_id].sigma,
+                    "rating_mean_after": new_rating.mu,
+                    "rating_deviation_after": new_rating.sigma,
+                    "game_player_stats_id": game_player_stats_ids.get(player_id),
+                }
+                for player_id, new_rating in new_ratings.items()
+            ],
+        )
 
-                await self._notify_rating_change(player_id, rating_type, new_rating)
+        await conn.execute(
+            _RATING_UPDATE,
+            [
+                {
+                    "b_player_id": player_id,
+                    "b_rating_type_id": rating_type_id,
+                    "b_mean": new_rating.mu,
+                    "b_deviation": new_rating.sigma,
+                    "b_victory_increment": 1 if player_id in winners else 0,
+                }
+                for player_id, new_rating in new_ratings.items()
+            ],
+        )
+
+    async def _notify_rating_changes(
+        self, rating_type: RatingType, new_ratings: Dict[PlayerID, Rating]
+    ) -> None:
+        """
+        Publishes the new ratings of all players of a game concurrently.
+        """
+        await asyncio.gather(
+            *(
+                self._notify_rating_change(player_id, rating_type, new_rating)
+                for player_id, new_rating in new_ratings.items()
+            )
+        )
 
     async def _notify_rating_change(
         self, player_id: PlayerID, rating_type: RatingType, new_rating: Rating
@@ -295,7 +457,17 @@ class RatingService:
             "Shutdown initiated. Waiting on current queue: %s", self._queue
         )
         await self._queue.join()
-        self._task = None
+        if self._task is not None:
+            # The worker is waiting for the next game, stop it so that a
+            # restarted service does not end up with two of them
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._stop_backlog_cron()
+        self._stop_rater_pool(wait=True)
         self._logger.debug("Queue emptied: %s", self._queue)
 
     def kill(self) -> None:
@@ -306,3 +478,15 @@ class RatingService:
         if self._task is not None:
             self._task.cancel()
             self._task = None
+        self._stop_backlog_cron()
+        self._stop_rater_pool(wait=False)
+
+    def _stop_backlog_cron(self) -> None:
+        if self._backlog_cron is not None:
+            self._backlog_cron.stop()
+            self._backlog_cron = None
+
+    def _stop_rater_pool(self, wait: bool) -> None:
+        if self._rater_pool is not None:
+            self._rater_pool.shutdown(wait=wait)
+            self._rater_pool = None
@@ -8,6 +8,7 @@ these should be put in the ``conftest.py'' relative to it.
 
 import asyncio
 import logging
+import sys
 
 import pytest
 
@@ -60,6 +61,11 @@ def pytest_addoption(parser):
 
 
 def pytest_configure(config):
+    if sys.platform != "win32":
+        import uvloop
+
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
     config.addinivalue_line(
         "markers", "slow: marks tests as slow (deselect with '-m \"not slow\"')"
     )
@@ -68,6 +74,18 @@ def pytest_configure(config):
     )
 
 
+@pytest.fixture(scope="session")
+def event_loop():
+    # pytest-asyncio only installs function scoped loops as the current loop,
+    # but the session scoped fixtures have to run on this one as well.
+    previous_loop = asyncio.get_event_loop()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    asyncio.set_event_loop(previous_loop)
+    loop.close()
+
+
 @pytest.fixture(scope="session", autouse=True)
 async def test_data(request):
     db = await global_database(request)
@@ -96,8 +114,8 @@ async def global_database(request):
     return db
 
 
-@pytest.fixture
-async def database(request, event_loop):
+@pytest.fixture(scope="session")
+async def session_database(request, event_loop):
     def opt(val):
         return request.config.getoption(val)
 
@@ -117,6 +135,12 @@ async def database(request, event_loop):
     await db.close()
 
 
+@pytest.fixture
+async def database(session_database):
+    async with session_database.savepoint():
+        yield session_database
+
+
 @pytest.fixture
 async def message_queue_service():
     service = MessageQueueService()
@@ -3,6 +3,7 @@ import asyncio
 import aio_pika
 import pytest
 
+import mock
 from service import config
 from service.message_queue_service import MessageQueueService, message_to_dict
 
@@ -47,6 +48,35 @@ async def test_consumer_receives(mq_service, consumer):
     assert consumer.callback_count() == 1
 
 
+async def test_listen_uses_separate_channels(mq_service):
+    await mq_service.listen(config.EXCHANGE_NAME, "test.first.#", mock.Mock())
+    await mq_service.listen(config.EXCHANGE_NAME, "test.second.#", mock.Mock())
+
+    first, second = mq_service._consumer_channels
+    assert first is not second
+
+
+async def test_listen_priority_queue(mq_service):
+    received = asyncio.Event()
+    callback = mock.Mock(side_effect=lambda message: received.set())
+    await mq_service.listen(
+        config.EXCHANGE_NAME, "test.priority.#", callback, max_priority=10
+    )
+
+    await mq_service.publish(
+        config.EXCHANGE_NAME,
+        "test.priority.key",
+        {"msg": "test message"},
+        aio_pika.DeliveryMode.NOT_PERSISTENT,
+        priority=5,
+    )
+
+    await asyncio.wait_for(received.wait(), timeout=2)
+
+    callback.assert_called_once()
+    assert callback.call_args[0][0].priority == 5
+
+
 async def test_reconnect(mq_service):
     await mq_service.declare_exchange("test_topic", aio_pika.ExchangeType.TOPIC)
     await mq_service.declare_exchange("test_direct", aio_pika.ExchangeType.DIRECT)
@@ -121,3 +151,4 @@ async def test_parse_incoming_message(mq_service, consumer):
     assert parsed_message["_exchange"] == exchange_name
     assert parsed_message["_routing_key"] == routing_key
     assert parsed_message["_ack"] == received_message.ack
+    assert parsed_message["_channel"] is received_message.channel
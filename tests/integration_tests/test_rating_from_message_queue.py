@@ -1,4 +1,5 @@
 import asyncio
+from types import MappingProxyType
 
 import pytest
 
@@ -11,9 +12,8 @@ from trueskill import Rating
 pytestmark = pytest.mark.asyncio
 
 
-@pytest.fixture
-def game_info():
-    return {
+_GAME_INFO = MappingProxyType(
+    {
         "game_id": 111,
         "rating_type": "global",
         "map_id": 222,
@@ -26,58 +26,78 @@ def game_info():
             {"outcome": "DEFEAT", "player_ids": [444]},
         ],
     }
+)
 
 
-async def test_rate_game(message_queue_service, rating_service, game_info, consumer):
-    outcome_to_id = {
-        team_dict["outcome"]: team_dict["player_ids"][0]
-        for team_dict in game_info["teams"]
-    }
+def _extract_ids(game_info):
+    return {team["outcome"]: team["player_ids"][0] for team in game_info["teams"]}
+
+
+_OUTCOME_TO_ID = _extract_ids(_GAME_INFO)
+
+
+@pytest.fixture
+def game_info():
+    # orjson only serializes real dicts
+    return dict(_GAME_INFO)
+
+
+def enqueued_event(rating_service, count=1) -> asyncio.Event:
+    """
+    Returns an event that is set once `count` games have been put into the
+    rating queue of `rating_service`.
+    """
+    enqueued = asyncio.Event()
+    put_nowait = rating_service._queue.put_nowait
+    remaining = count
+
+    def put_and_count(item):
+        nonlocal remaining
+        put_nowait(item)
+        remaining -= 1
+        if remaining == 0:
+            enqueued.set()
+
+    rating_service._queue.put_nowait = put_and_count
+    return enqueued
 
+
+async def test_rate_game(message_queue_service, rating_service, game_info, consumer):
+    enqueued = enqueued_event(rating_service)
     await message_queue_service.publish(
         config.EXCHANGE_NAME, config.RATING_REQUEST_ROUTING_KEY, game_info
     )
 
-    await asyncio.sleep(0.1)
+    await asyncio.wait_for(enqueued.wait(), timeout=2)
     await rating_service._join_rating_queue()
 
     rating_type_id = rating_service._rating_type_ids["global"]
 
     async with rating_service._db.acquire() as conn:
-        sql = select([leaderboard_rating.c.mean]).where(
+        sql = select([leaderboard_rating.c.login_id, leaderboard_rating.c.mean]).where(
             and_(
-                leaderboard_rating.c.login_id == outcome_to_id["VICTORY"],
+                leaderboard_rating.c.login_id.in_(list(_OUTCOME_TO_ID.values())),
                 leaderboard_rating.c.leaderboard_id == rating_type_id,
             )
         )
         results = await conn.execute(sql)
-        winner_rating_row = await results.fetchone()
-
-        sql = select([leaderboard_rating.c.mean]).where(
-            and_(
-                leaderboard_rating.c.login_id == outcome_to_id["DEFEAT"],
-                leaderboard_rating.c.leaderboard_id == rating_type_id,
-            )
-        )
-        results = await conn.execute(sql)
-        loser_rating_row = await results.fetchone()
+        means = {row["login_id"]: row["mean"] for row in await results.fetchall()}
 
         sql = select([leaderboard_rating_journal])
         results = await conn.execute(sql)
-        journal_row = await results.fetchone()
+        journal_row = await results.first()
 
-    assert winner_rating_row is not None
-    assert winner_rating_row["mean"] > 1500
+    winner_mean = means.get(_OUTCOME_TO_ID["VICTORY"])
+    assert winner_mean is not None
+    assert winner_mean > 1500
 
-    assert loser_rating_row is not None
-    assert loser_rating_row["mean"] < 1500
+    loser_mean = means.get(_OUTCOME_TO_ID["DEFEAT"])
+    assert loser_mean is not None
+    assert loser_mean < 1500
 
     assert journal_row is not None
     assert journal_row["leaderboard_id"] == rating_type_id
-    assert journal_row["rating_mean_after"] in (
-        winner_rating_row["mean"],
-        loser_rating_row["mean"],
-    )
+    assert journal_row["rating_mean_after"] in (winner_mean, loser_mean)
 
     assert any(
         message.routing_key == "success.rating.update"
@@ -107,15 +127,16 @@ async def test_notify_rating_change(rating_service, consumer):
 
 async def test_rate_multiple_games(message_queue_service, rating_service, game_info):
     message_count = 1000
+    enqueued = enqueued_event(rating_service, message_count)
     for _ in range(message_count):
         await message_queue_service.publish(
             config.EXCHANGE_NAME, config.RATING_REQUEST_ROUTING_KEY, game_info
         )
 
-    await asyncio.sleep(0.1)
+    await asyncio.wait_for(enqueued.wait(), timeout=10)
     await rating_service._join_rating_queue()
 
-    player_id = game_info["teams"][0]["player_ids"][0]
+    player_id = _OUTCOME_TO_ID["VICTORY"]
     rating_type_id = rating_service._rating_type_ids["global"]
     async with rating_service._db.acquire() as conn:
         sql = select([leaderboard_rating.c.total_games]).where(
@@ -125,6 +146,25 @@ async def test_rate_multiple_games(message_queue_service, rating_service, game_i
             )
         )
         results = await conn.execute(sql)
-        game_count = await results.fetchone()
+        game_count = await results.first()
 
     assert game_count["total_games"] == message_count
+
+
+async def test_notify_rating_changes(rating_service, consumer):
+    new_ratings = {1: Rating(1000, 100), 2: Rating(2000, 200)}
+    rating_type = "global"
+
+    await rating_service._notify_rating_changes(rating_type, new_ratings)
+    await asyncio.sleep(0.1)
+
+    parsed_messages = [
+        message_to_dict(message) for message in consumer.received_messages
+    ]
+    for player_id, new_rating in new_ratings.items():
+        assert any(
+            message.get("player_id") == player_id
+            and message.get("new_rating_mean") == new_rating.mu
+            and message.get("rating_type") == rating_type
+            for message in parsed_messages
+        )
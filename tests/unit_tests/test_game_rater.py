@@ -0,0 +1,30 @@
+import pytest
+
+import trueskill
+from service.rating_service.game_rater import GameRater
+from service.rating_service.typedefs import GameOutcome, TeamRatingData
+from trueskill import Rating
+
+
+@pytest.mark.parametrize(
+    "outcomes,ranks",
+    [
+        ((GameOutcome.VICTORY, GameOutcome.DEFEAT), [0, 1]),
+        ((GameOutcome.DEFEAT, GameOutcome.VICTORY), [1, 0]),
+        ((GameOutcome.DRAW, GameOutcome.DRAW), [0, 0]),
+    ],
+)
+def test_compute_rating_1v1_matches_trueskill(outcomes, ranks):
+    ratings = ({1: Rating(1700, 150)}, {2: Rating(1400, 400)})
+    rating_data = [
+        TeamRatingData(outcome, team_ratings)
+        for outcome, team_ratings in zip(outcomes, ratings)
+    ]
+
+    new_ratings = GameRater.compute_rating(rating_data)
+
+    expected_groups = trueskill.rate(ratings, ranks)
+    for expected_group in expected_groups:
+        for player_id, expected in expected_group.items():
+            assert new_ratings[player_id].mu == pytest.approx(expected.mu)
+            assert new_ratings[player_id].sigma == pytest.approx(expected.sigma)
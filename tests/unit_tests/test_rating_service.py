@@ -1,17 +1,17 @@
-from unittest import mock
+import json
 
 import pytest
 
-from asynctest import CoroutineMock
+import mock
 from service.db import FAFDatabase
 from service.db.models import (game_player_stats, leaderboard_rating,
                                leaderboard_rating_journal)
+from service.rating_service.game_info import EndedGameInfo, ValidityState
 from service.rating_service.rating_service import (RatingService,
                                                    ServiceNotReadyError)
-from service.rating_service.typedefs import (EndedGameInfo, GameOutcome,
+from service.rating_service.typedefs import (GameOutcome,
                                              GameRatingSummaryWithCallback,
-                                             TeamRatingData, TeamRatingSummary,
-                                             ValidityState)
+                                             TeamRatingData, TeamRatingSummary)
 from sqlalchemy import and_, select
 from trueskill import Rating
 
@@ -31,10 +31,17 @@ def uninitialized_service(database, message_queue_service):
     return RatingService(database, message_queue_service)
 
 
+@pytest.fixture(scope="module")
+async def rating_type_ids(session_database):
+    service = RatingService(session_database, None)
+    await service.update_data()
+    return service._rating_type_ids
+
+
 @pytest.fixture
-async def semiinitialized_service(database, message_queue_service):
+def semiinitialized_service(database, message_queue_service, rating_type_ids):
     service = RatingService(database, message_queue_service)
-    await service.update_data()
+    service._rating_type_ids = dict(rating_type_ids)
     return service
 
 
@@ -65,7 +72,7 @@ def game_info():
             TeamRatingSummary(GameOutcome.VICTORY, {1}),
             TeamRatingSummary(GameOutcome.DEFEAT, {2}),
         ],
-    )
+    ).to_dict()
 
 
 @pytest.fixture
@@ -85,19 +92,41 @@ def bad_game_info():
             TeamRatingSummary(GameOutcome.VICTORY, {1}),
             TeamRatingSummary(GameOutcome.VICTORY, {2}),
         ],
-    )
+    ).to_dict()
 
 
 async def test_enqueue_manual_initialization(uninitialized_service, game_info):
     service = uninitialized_service
     await service.initialize()
-    service._rate = CoroutineMock()
-    await service.enqueue(game_info.to_dict())
+    service._rate = mock.AsyncMock()
+    await service.enqueue(game_info)
     await service.shutdown()
 
     service._rate.assert_called()
 
 
+async def test_rate_after_restart(uninitialized_service, game_info):
+    service = uninitialized_service
+    service._persist_rating_changes = mock.AsyncMock()
+    await service.initialize()
+    first_worker = service._task
+    await service.shutdown()
+
+    assert first_worker.done()
+
+    await service.initialize()
+    await service.enqueue(game_info)
+    await service._join_rating_queue()
+
+    # Only the worker of the second initialization is left
+    assert first_worker.done()
+    assert service._task is not first_worker
+    assert not service._task.done()
+    service.kill()
+
+    service._persist_rating_changes.assert_called_once()
+
+
 async def double_initialization_does_not_start_second_worker(rating_service):
     worker_task_id = id(rating_service._task)
 
@@ -108,9 +137,9 @@ async def double_initialization_does_not_start_second_worker(rating_service):
 
 async def test_enqueue_initialized(rating_service, game_info):
     service = rating_service
-    service._rate = CoroutineMock()
+    service._rate = mock.AsyncMock()
 
-    await service.enqueue(game_info.to_dict())
+    await service.enqueue(game_info)
     await service.shutdown()
 
     service._rate.assert_called()
@@ -119,14 +148,25 @@ async def test_enqueue_initialized(rating_service, game_info):
 async def test_enqueue_uninitialized(uninitialized_service, game_info):
     service = uninitialized_service
     with pytest.raises(ServiceNotReadyError):
-        await service.enqueue(game_info.to_dict())
+        await service.enqueue(game_info)
     await service.shutdown()
 
 
-async def test_get_rating_uninitialized(uninitialized_service):
+async def test_handle_message_uninitialized_requeued(uninitialized_service, game_info):
     service = uninitialized_service
-    with pytest.raises(ServiceNotReadyError):
-        await service._get_player_rating(1, "global")
+    message = mock.Mock(body=json.dumps(game_info).encode())
+
+    service.handle_message(message)
+
+    message.nack.assert_called_once_with(requeue=True)
+    message.ack.assert_not_called()
+
+
+async def test_get_rating_uninitialized(uninitialized_service, game_rating_summary):
+    service = uninitialized_service
+    async with service._db.acquire() as conn:
+        with pytest.raises(ServiceNotReadyError):
+            await service._get_rating_data(conn, game_rating_summary)
 
 
 async def test_load_rating_type_ids(uninitialized_service):
@@ -136,20 +176,23 @@ async def test_load_rating_type_ids(uninitialized_service):
     assert service._rating_type_ids == {"global": 1, "ladder_1v1": 2}
 
 
-async def test_get_player_rating_global(semiinitialized_service):
+@pytest.mark.parametrize(
+    "rating_type,true_rating",
+    [("global", Rating(1200, 250)), ("ladder_1v1", Rating(1300, 400))],
+)
+async def test_get_player_ratings_bulk(
+    semiinitialized_service, rating_type, true_rating
+):
     service = semiinitialized_service
     player_id = 50
-    true_rating = Rating(1200, 250)
-    rating = await service._get_player_rating(player_id, "global")
-    assert rating == true_rating
+    rating_type_id = service._rating_type_ids[rating_type]
 
+    async with service._db.acquire() as conn:
+        ratings = await service._get_player_ratings_bulk(
+            conn, frozenset({player_id}), rating_type_id
+        )
 
-async def test_get_player_rating_ladder(semiinitialized_service):
-    service = semiinitialized_service
-    player_id = 50
-    true_rating = Rating(1300, 400)
-    rating = await service._get_player_rating(player_id, "ladder_1v1")
-    assert rating == true_rating
+    assert ratings == {player_id: true_rating}
 
 
 async def get_all_ratings(db: FAFDatabase, player_id: int):
@@ -171,12 +214,15 @@ async def test_get_new_player_rating_created(semiinitialized_service):
     """
     service = semiinitialized_service
     player_id = 999
-    rating_type = "ladder_1v1"
+    rating_type_id = service._rating_type_ids["ladder_1v1"]
 
     db_ratings = await get_all_ratings(service._db, player_id)
     assert len(db_ratings) == 0  # Rating does not exist yet
 
-    await service._get_player_rating(player_id, rating_type)
+    async with service._db.acquire() as conn:
+        await service._get_player_ratings_bulk(
+            conn, frozenset({player_id}), rating_type_id
+        )
 
     db_ratings = await get_all_ratings(service._db, player_id)
     assert len(db_ratings) == 1  # Rating has been created
@@ -206,7 +252,8 @@ async def test_get_rating_data(semiinitialized_service):
         None,
     )
 
-    rating_data = await service._get_rating_data(summary)
+    async with service._db.acquire() as conn:
+        rating_data, _ = await service._get_rating_data(conn, summary)
 
     player1_expected_data = TeamRatingData(
         player1_outcome, {player1_id: player1_db_rating}
@@ -219,9 +266,37 @@ async def test_get_rating_data(semiinitialized_service):
     assert rating_data[1] == player2_expected_data
 
 
+async def test_get_rating_data_new_players(semiinitialized_service):
+    """
+    Rating entries for all players without one should be created at once.
+    """
+    service = semiinitialized_service
+    new_player_ids = (997, 998)
+    default_rating = Rating(1500, 500)
+
+    summary = GameRatingSummaryWithCallback(
+        1,
+        "global",
+        [
+            TeamRatingSummary(GameOutcome.VICTORY, {1, new_player_ids[0]}),
+            TeamRatingSummary(GameOutcome.DEFEAT, {2, new_player_ids[1]}),
+        ],
+        None,
+    )
+
+    async with service._db.acquire() as conn:
+        rating_data, _ = await service._get_rating_data(conn, summary)
+
+    assert rating_data[0].ratings[new_player_ids[0]] == default_rating
+    assert rating_data[1].ratings[new_player_ids[1]] == default_rating
+    for player_id in new_player_ids:
+        db_ratings = await get_all_ratings(service._db, player_id)
+        assert len(db_ratings) == 1
+
+
 async def test_rating(semiinitialized_service, game_rating_summary):
     service = semiinitialized_service
-    service._persist_rating_changes = CoroutineMock()
+    service._persist_rating_changes = mock.AsyncMock()
 
     await service._rate(game_rating_summary)
 
@@ -238,13 +313,13 @@ async def test_rating_persistence(semiinitialized_service):
     old_ratings = {player_id: Rating(1000, 500)}
     after_mean = 1234
     new_ratings = {player_id: Rating(after_mean, 400)}
-    outcomes = {player_id: GameOutcome.VICTORY}
-
-    await service._persist_rating_changes(
-        game_id, rating_type, old_ratings, new_ratings, outcomes
-    )
+    winners = frozenset({player_id})
 
     async with service._db.acquire() as conn:
+        await service._persist_rating_changes(
+            conn, game_id, rating_type, old_ratings, new_ratings, winners
+        )
+
         sql = select([game_player_stats.c.id, game_player_stats.c.after_mean]).where(
             and_(
                 game_player_stats.c.gameId == game_id,
@@ -252,7 +327,7 @@ async def test_rating_persistence(semiinitialized_service):
             )
         )
         results = await conn.execute(sql)
-        gps_row = await results.fetchone()
+        gps_row = await results.first()
 
         sql = select([leaderboard_rating.c.mean]).where(
             and_(
@@ -261,14 +336,14 @@ async def test_rating_persistence(semiinitialized_service):
             )
         )
         results = await conn.execute(sql)
-        rating_row = await results.fetchone()
+        rating_row = await results.first()
 
         sql = select([leaderboard_rating_journal]).where(
             leaderboard_rating_journal.c.game_player_stats_id
             == gps_row[game_player_stats.c.id]
         )
         results = await conn.execute(sql)
-        journal_row = await results.fetchone()
+        journal_row = await results.first()
 
     assert rating_row[leaderboard_rating.c.mean] == after_mean
     assert journal_row[leaderboard_rating_journal.c.rating_mean_after] == after_mean
@@ -280,13 +355,12 @@ async def test_rating_persistence(semiinitialized_service):
 
 async def test_message_callback_made(rating_service, game_info):
     service = rating_service
-    service._persist_rating_changes = CoroutineMock()
+    service._persist_rating_changes = mock.AsyncMock()
 
     callback = mock.Mock()
-    game_info_dict = game_info.to_dict()
-    game_info_dict["_ack"] = callback
+    game_info["_ack"] = callback
 
-    await service.enqueue(game_info_dict)
+    await service.enqueue(game_info)
     await service._join_rating_queue()
 
     callback.assert_called()
@@ -294,11 +368,11 @@ async def test_message_callback_made(rating_service, game_info):
 
 async def test_game_rating_error_handled(rating_service, game_info, bad_game_info):
     service = rating_service
-    service._persist_rating_changes = CoroutineMock()
+    service._persist_rating_changes = mock.AsyncMock()
     service._logger = mock.Mock()
 
-    await service.enqueue(bad_game_info.to_dict())
-    await service.enqueue(game_info.to_dict())
+    await service.enqueue(bad_game_info)
+    await service.enqueue(game_info)
 
     await service._join_rating_queue()
 
@@ -306,3 +380,87 @@ async def test_game_rating_error_handled(rating_service, game_info, bad_game_inf
     service._logger.warning.assert_called()
     # second game: results have been saved.
     service._persist_rating_changes.assert_called_once()
+
+
+async def test_games_sharing_players_rated_in_separate_batches():
+    def summary(game_id, *player_ids):
+        return GameRatingSummaryWithCallback(
+            game_id,
+            "global",
+            [
+                TeamRatingSummary(GameOutcome.VICTORY, {player_ids[0]}),
+                TeamRatingSummary(GameOutcome.DEFEAT, {player_ids[1]}),
+            ],
+            None,
+        )
+
+    first, second, third = summary(1, 1, 2), summary(2, 3, 4), summary(3, 2, 5)
+
+    batches = RatingService._independent_batches([first, second, third])
+
+    assert batches == [[first, second], [third]]
+
+
+async def test_unknown_rating_type_reloads_rating_type_ids(
+    semiinitialized_service, game_rating_summary
+):
+    service = semiinitialized_service
+    service._rating_type_ids = {"global": 1}
+    summary = game_rating_summary._replace(
+        rating_type="ladder_1v1",
+        teams=[
+            TeamRatingSummary(GameOutcome.VICTORY, {50}),
+            TeamRatingSummary(GameOutcome.DEFEAT, {2}),
+        ],
+    )
+
+    async with service._db.acquire() as conn:
+        _, ratings = await service._get_rating_data(conn, summary)
+
+    assert ratings[50] == Rating(1300, 400)
+    assert service._rating_type_ids == {"global": 1, "ladder_1v1": 2}
+
+
+async def test_get_rating_data_unknown_rating_type(
+    semiinitialized_service, game_rating_summary
+):
+    service = semiinitialized_service
+    summary = game_rating_summary._replace(rating_type="nonexistent")
+
+    async with service._db.acquire() as conn:
+        with pytest.raises(ValueError):
+            await service._get_rating_data(conn, summary)
+
+
+async def test_message_callbacks_batched(rating_service, game_info):
+    service = rating_service
+    service._persist_rating_changes = mock.AsyncMock()
+
+    first_callback = mock.Mock()
+    last_callback = mock.Mock()
+    for callback in (first_callback, last_callback):
+        game_info_dict = dict(game_info)
+        game_info_dict["_ack"] = callback
+        await service.enqueue(game_info_dict)
+
+    await service._join_rating_queue()
+
+    first_callback.assert_not_called()
+    last_callback.assert_called_once_with(multiple=True)
+
+
+async def test_message_callbacks_acknowledged_per_channel():
+    callbacks = [mock.Mock() for _ in range(4)]
+    channels = ("first", "second", "first", "second")
+
+    RatingService._acknowledge(
+        [
+            GameRatingSummaryWithCallback(1, "global", [], callback, channel)
+            for callback, channel in zip(callbacks, channels)
+        ]
+    )
+
+    callbacks[0].assert_not_called()
+    callbacks[1].assert_not_called()
+    callbacks[2].assert_called_once_with(multiple=True)
+    callbacks[3].assert_called_once_with(multiple=True)
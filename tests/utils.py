@@ -1,6 +1,7 @@
 import asyncio
 import functools
 from asyncio import Event, Lock
+from contextlib import asynccontextmanager
 
 import asynctest
 from aiomysql.sa import create_engine
@@ -72,13 +73,38 @@ def fast_forward(timeout):
     return deco
 
 
+class MockConnection:
+    """
+    Proxies the connection kept open by MockDatabase. Transactions started on
+    it become savepoints inside the transaction that is rolled back once the
+    test is over, so committing them does not leak any data.
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    @asynccontextmanager
+    async def begin(self):
+        transaction = await self._connection.begin_nested()
+        try:
+            yield transaction
+        except BaseException:
+            await transaction.rollback()
+            raise
+        else:
+            await transaction.commit()
+
+
 class MockConnectionContext:
     def __init__(self, db):
         self._db = db
 
     async def __aenter__(self):
         await self._db._lock.acquire()
-        return self._db._connection
+        return MockConnection(self._db._connection)
 
     async def __aexit__(self, exc_type, exc, tb):
         self._db._lock.release()
@@ -92,8 +118,10 @@ class MockDatabase:
     Since the server uses that single connection, it sees all changes made, but
     at the same time we can rollback all these changes once the test is over.
 
-    Note that right now the server relies on autocommit behaviour of aiomysql.
-    Any future manual commit() calls should be mocked here as well.
+    The connection is shared by the whole test session, each test runs inside
+    a savepoint which is rolled back afterwards, see ``savepoint``.
+    Transactions begun by the server are turned into savepoints of that
+    transaction, see MockConnection.
     """
 
     def __init__(self, loop):
@@ -134,14 +162,29 @@ class MockDatabase:
 
     async def _keep_connection(self):
         async with self.engine.acquire() as conn:
+            transaction = await conn.begin()
             self._connection = conn
             self._conn_present.set()
             await self._done.wait()
             self._connection = None
+            await transaction.rollback()
 
     def acquire(self):
         return MockConnectionContext(self)
 
+    @asynccontextmanager
+    async def savepoint(self):
+        """
+        Discards all changes made inside of the context once it is left.
+        """
+        async with self._lock:
+            transaction = await self._connection.begin_nested()
+        try:
+            yield
+        finally:
+            async with self._lock:
+                await transaction.rollback()
+
     async def close(self):
         if self.engine is None:
             return